@@ -1,6 +1,58 @@
 from bitcoinrpc.authproxy import AuthServiceProxy
+import http.client
+import socket
 import time
-from decimal import Decimal
+
+SATS_PER_BTC = 100_000_000
+
+def vsize_of_hex(hex_tx):
+    """Compute a transaction's virtual size locally from its serialized hex.
+
+    Walks the BIP144 serialization once to split base size from witness data,
+    then applies BIP141: weight = base_size * 3 + total_size, vsize =
+    ceil(weight / 4). Saves the decoderawtransaction round-trip that was only
+    ever used to read vsize.
+    """
+    raw = bytes.fromhex(hex_tx)
+
+    def read_varint(pos):
+        v = raw[pos]
+        if v < 0xfd:
+            return v, pos + 1
+        if v == 0xfd:
+            return int.from_bytes(raw[pos + 1:pos + 3], 'little'), pos + 3
+        if v == 0xfe:
+            return int.from_bytes(raw[pos + 1:pos + 5], 'little'), pos + 5
+        return int.from_bytes(raw[pos + 1:pos + 9], 'little'), pos + 9
+
+    pos = 4  # version
+    is_segwit = raw[pos] == 0x00 and raw[pos + 1] == 0x01
+    if is_segwit:
+        pos += 2  # marker + flag
+    input_count, pos = read_varint(pos)
+    for _ in range(input_count):
+        pos += 36  # prevout txid + index
+        script_len, pos = read_varint(pos)
+        pos += script_len + 4  # scriptSig + sequence
+    output_count, pos = read_varint(pos)
+    for _ in range(output_count):
+        pos += 8  # value
+        script_len, pos = read_varint(pos)
+        pos += script_len
+    witness_size = 0
+    if is_segwit:
+        witness_start = pos
+        for _ in range(input_count):
+            item_count, pos = read_varint(pos)
+            for _ in range(item_count):
+                item_len, pos = read_varint(pos)
+                pos += item_len
+        witness_size = (pos - witness_start) + 2  # marker + flag discount too
+
+    total_size = len(raw)
+    base_size = total_size - witness_size
+    weight = base_size * 3 + total_size
+    return (weight + 3) // 4
 
 # RPC Connection Details
 RPC_USER = "alice"
@@ -8,13 +60,27 @@ RPC_PASSWORD = "password"
 RPC_PORT = 18443  # Default for regtest
 RPC_HOST = "127.0.0.1"
 
-# Connect to Bitcoin Node via RPC
+class NoDelayHTTPConnection(http.client.HTTPConnection):
+    """Keep-alive HTTP connection with Nagle disabled.
+
+    The script issues many small JSON-RPC POSTs to a local bitcoind;
+    TCP_NODELAY flushes them immediately instead of letting the kernel
+    coalesce, saving a round-trip's worth of latency per call.
+    """
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+# Connect to Bitcoin Node via RPC over a single persistent connection; the
+# wallet proxy created later reuses it, since only the URL path differs.
+rpc_http_conn = NoDelayHTTPConnection(RPC_HOST, RPC_PORT, timeout=120)
 rpc_url = f"http://{RPC_USER}:{RPC_PASSWORD}@{RPC_HOST}:{RPC_PORT}"
-rpc_conn = AuthServiceProxy(rpc_url)
+rpc_conn = AuthServiceProxy(rpc_url, connection=rpc_http_conn)
 
-# Test connection
+# Test connection. The initial probe and the wallet listing are independent,
+# so batch them into a single HTTP round-trip.
 try:
-    blockchain_info = rpc_conn.getblockchaininfo()
+    blockchain_info, existing_wallets = rpc_conn.batch_([["getblockchaininfo"], ["listwallets"]])
     print("Connected successfully to Bitcoin Node!")
     print(f"Block height: {blockchain_info['blocks']}")
 except Exception as e:
@@ -23,17 +89,21 @@ except Exception as e:
 
 # Step 1: Check if Wallet Exists and Use It
 wallet_name = "testwallet"
-existing_wallets = rpc_conn.listwallets()
 
 if wallet_name not in existing_wallets:
     print(f"Wallet '{wallet_name}' not found. Creating and loading it...")
     rpc_conn.createwallet(wallet_name)
-    time.sleep(2)
+    # Poll until the node reports the wallet as loaded instead of a fixed sleep
+    deadline = time.time() + 30
+    while wallet_name not in rpc_conn.listwallets():
+        if time.time() > deadline:
+            raise Exception(f"Wallet '{wallet_name}' did not load in time")
+        time.sleep(0.02)
 else:
     print(f"Wallet '{wallet_name}' is already loaded.")
 
-# Connect to the wallet RPC
-rpc_conn = AuthServiceProxy(f"http://{RPC_USER}:{RPC_PASSWORD}@{RPC_HOST}:{RPC_PORT}/wallet/{wallet_name}")
+# Connect to the wallet RPC, reusing the same keep-alive connection
+rpc_conn = AuthServiceProxy(f"{rpc_url}/wallet/{wallet_name}", connection=rpc_http_conn)
 
 # Step 2: Generate New Address for Mining Rewards
 btc_address = rpc_conn.getnewaddress()
@@ -41,98 +111,63 @@ print(f"New address for mining rewards: {btc_address}")
 
 # Step 3: Mine Blocks to Fund Wallet
 print("Mining 101 blocks to fund the wallet...")
+start_height = blockchain_info['blocks']
 rpc_conn.generatetoaddress(200, btc_address)
-time.sleep(5)
-
-# Step 4: Select Enough UTXOs for Transaction
-required_amount = Decimal("100.0")  # BTC to send
-selected_utxos = []
-total_selected_amount = Decimal("0")
-
-utxos = rpc_conn.listunspent()
-if not utxos:
-    raise Exception("No UTXOs found! Ensure the wallet has funds by mining blocks.")
-
-# Select UTXOs with 10% buffer for fee estimation
-for utxo in utxos:
-    selected_utxos.append({
-        "txid": utxo["txid"],
-        "vout": utxo["vout"]
-    })
-    total_selected_amount += Decimal(str(utxo["amount"]))
-    if total_selected_amount >= required_amount * Decimal("1.1"):
-        break
-
-if total_selected_amount < required_amount:
-    raise Exception(f"Not enough funds! Available: {total_selected_amount} BTC, Needed: {required_amount} BTC")
-
-print(f"Selected UTXOs with a total of {total_selected_amount} BTC")
-
-# Step 5: Create Initial Transaction Structure
+# Poll the chain tip until all mined blocks are connected instead of a fixed
+# sleep that is both slower than needed and flaky under load
+deadline = time.time() + 60
+while rpc_conn.getblockcount() < start_height + 200:
+    if time.time() > deadline:
+        raise Exception("Mined blocks were not connected in time")
+    time.sleep(0.02)
+
+# Step 4: Create Transaction Outputs. Amounts are tracked as integer
+# satoshis (exact, and far cheaper than Decimal); BTC floats only appear at
+# the RPC boundary, which expects them.
+required_sats = 100 * SATS_PER_BTC  # BTC to send
 recipient_address = "bcrt1qq2yshcmzdlznnpxx258xswqlmqcxjs4dssfxt2"
 
-# CORRECTED STEP 5: Create OP_RETURN output
+# Create OP_RETURN output
 op_return_message = "We are all Satoshi!!"
 op_return_bytes = op_return_message.encode("utf-8")[:20]  # Strictly limit to 20 bytes after encoding
 op_return_data = op_return_bytes.hex()  # Only raw data bytes
 
 outputs = {
-    recipient_address: float(required_amount),
+    recipient_address: required_sats / SATS_PER_BTC,
     "data": op_return_data  # Let Bitcoin Core add OP_RETURN + push opcode
 }
 
 print(f"OP_RETURN raw data: {op_return_data} (20 bytes)")
 
-
-# Step 6: Fee Calculation with Change Recalculation Loop
+# Step 5: Fund, Sign and Finalize via PSBT
+# walletcreatefundedpsbt does coin selection, fee calculation and change
+# handling in a single RPC, replacing the manual UTXO loop and the iterative
+# create/sign/decode fee-stabilization round-trips.
 fee_rate = 21  # sats/vB
-max_attempts = 3
-
-for attempt in range(max_attempts):
-    # Create temporary transaction
-    raw_tx = rpc_conn.createrawtransaction(selected_utxos, outputs)
-    signed_tx = rpc_conn.signrawtransactionwithwallet(raw_tx)
-    tx_details = rpc_conn.decoderawtransaction(signed_tx["hex"])
-    
-    tx_size_vb = tx_details["vsize"]
-    total_fee_sats = tx_size_vb * fee_rate
-    total_fee_btc = Decimal(total_fee_sats) / Decimal(1e8)
-    
-    # Calculate required funds with updated fee
-    required_total = required_amount + total_fee_btc
-    change_amount = total_selected_amount - required_total
-    
-    if change_amount < 0:
-        raise Exception(f"Insufficient funds! Need {required_total:.8f} BTC, have {total_selected_amount:.8f} BTC")
-    
-    # Update or add change output
-    if change_amount > 0:
-        if 'change_address' not in locals():
-            change_address = rpc_conn.getnewaddress()
-        outputs[change_address] = float(change_amount)
-    else:
-        if change_address in outputs:
-            del outputs[change_address]
-    
-    # Check if we've reached equilibrium
-    if attempt > 0 and abs(prev_fee - total_fee_sats) < 10:
-        break
-        
-    prev_fee = total_fee_sats
-
-print(f"Final Transaction Size: {tx_size_vb} vB")
-print(f"Final Fee: {total_fee_btc:.8f} BTC ({fee_rate} sats/vB)")
 
-# Step 7: Create and Broadcast Final Transaction
-final_raw_tx = rpc_conn.createrawtransaction(selected_utxos, outputs)
-final_signed_tx = rpc_conn.signrawtransactionwithwallet(final_raw_tx)
+funded = rpc_conn.walletcreatefundedpsbt([], outputs, 0, {"fee_rate": fee_rate})
+processed = rpc_conn.walletprocesspsbt(funded["psbt"])
 
-if not final_signed_tx["complete"]:
+if not processed["complete"]:
     raise Exception("Transaction signing failed!")
 
-txid = rpc_conn.sendrawtransaction(final_signed_tx["hex"])
+finalized = rpc_conn.finalizepsbt(processed["psbt"])
+
+# Step 6: Broadcast Final Transaction. vsize is computed locally from the
+# finalized hex; the node is only asked to decode as a fallback if the local
+# parse chokes on something unexpected.
+try:
+    tx_size_vb = vsize_of_hex(finalized["hex"])
+except (IndexError, ValueError):
+    tx_size_vb = rpc_conn.decoderawtransaction(finalized["hex"])["vsize"]
+
+txid = rpc_conn.sendrawtransaction(finalized["hex"])
+
+fee_sats = round(funded['fee'] * SATS_PER_BTC)
+print(f"Final Transaction Size: {tx_size_vb} vB")
+print(f"Final Fee: {fee_sats} sats ({fee_rate} sats/vB)")
 
-# Step 8: Save Transaction ID
+# Step 7: Save Transaction ID
 with open("out.txt", "w") as f:
     f.write(txid)
 
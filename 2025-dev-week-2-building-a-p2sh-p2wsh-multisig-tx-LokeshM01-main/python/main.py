@@ -1,20 +1,45 @@
 import hashlib
 import struct
-from ecdsa import SigningKey, SECP256k1
-from ecdsa.util import sigencode_der
+from coincurve import PrivateKey
 import base58
 
+# Resolve a ripemd160 constructor once at import time: hashlib.new does a
+# string lookup through OpenSSL on every call, and OpenSSL 3 no longer ships
+# ripemd160 in its default provider, so fall back to pycryptodome's C
+# implementation where the legacy provider is missing.
+try:
+    hashlib.new('ripemd160', b'')
+    def _ripemd160(data):
+        return hashlib.new('ripemd160', data).digest()
+except ValueError:
+    from Crypto.Hash import RIPEMD160
+    def _ripemd160(data):
+        return RIPEMD160.new(data).digest()
+
+# Helper function for the standard Bitcoin RIPEMD160(SHA256(x)) hash
+def hash160(data):
+    """Apply SHA256 followed by RIPEMD160, as used for script and key hashes."""
+    return _ripemd160(hashlib.sha256(data).digest())
+
+# Varint serialization: almost every call here encodes a small script or
+# stack-item length, so the sub-0xfd encodings are precomputed once and the
+# wider packers prebuilt to skip per-call format-string parsing.
+_SMALL_VARINTS = [bytes([i]) for i in range(0xfd)]
+_PACK_U16 = struct.Struct('<H').pack
+_PACK_U32 = struct.Struct('<I').pack
+_PACK_U64 = struct.Struct('<Q').pack
+
 # Helper function to serialize variable-length integers
 def serialize_varint(value):
     """Serialize a variable-length integer to bytes."""
     if value < 0xfd:
-        return bytes([value])
+        return _SMALL_VARINTS[value]
     elif value <= 0xffff:
-        return b'\xfd' + struct.pack('<H', value)
+        return b'\xfd' + _PACK_U16(value)
     elif value <= 0xffffffff:
-        return b'\xfe' + struct.pack('<I', value)
+        return b'\xfe' + _PACK_U32(value)
     else:
-        return b'\xff' + struct.pack('<Q', value)
+        return b'\xff' + _PACK_U64(value)
 
 # Function to create witness program from a redeem script
 def create_witness_program(redeem_script):
@@ -29,8 +54,7 @@ def create_scriptSig(witness_program):
 # Function to derive a P2SH address from the witness program
 def derive_p2sh_address(witness_program):
     """Derive the P2SH address from the witness program by performing a RIPEMD160(SHA256) hash."""
-    hash160 = hashlib.new('ripemd160', hashlib.sha256(witness_program).digest()).digest()
-    return base58.b58encode_check(b'\x05' + hash160).decode()
+    return base58.b58encode_check(b'\x05' + hash160(witness_program)).decode()
 
 # Function to create the scriptPubKey for an output address
 def create_scriptPubKey(output_address):
@@ -42,65 +66,81 @@ def create_scriptPubKey(output_address):
 # Function to serialize inputs for transaction
 def serialize_inputs(tx_inputs):
     """Serialize transaction inputs into a byte stream."""
-    serialized_inputs = b''
+    parts = []
     for txin in tx_inputs:
-        serialized_inputs += txin['prev_txid']
-        serialized_inputs += struct.pack('<I', txin['prev_index'])
-        serialized_inputs += serialize_varint(len(txin['script_sig'])) + txin['script_sig']
-        serialized_inputs += struct.pack('<I', txin['sequence'])
-    return serialized_inputs
+        parts.append(txin['prev_txid'])
+        parts.append(_PACK_U32(txin['prev_index']))
+        parts.append(serialize_varint(len(txin['script_sig'])))
+        parts.append(txin['script_sig'])
+        parts.append(_PACK_U32(txin['sequence']))
+    return b''.join(parts)
 
 # Function to serialize outputs for transaction
 def serialize_outputs(tx_outputs):
     """Serialize transaction outputs into a byte stream."""
-    serialized_outputs = b''
+    parts = []
     for txout in tx_outputs:
-        serialized_outputs += struct.pack('<Q', txout['value'])
-        serialized_outputs += serialize_varint(len(txout['script_pubkey'])) + txout['script_pubkey']
-    return serialized_outputs
-
-# Function to create sighash for the transaction
-def calculate_sighash(tx_version, tx_inputs, tx_outputs, redeem_script, locktime):
-    """Calculate the BIP143 sighash for the transaction."""
+        parts.append(_PACK_U64(txout['value']))
+        parts.append(serialize_varint(len(txout['script_pubkey'])))
+        parts.append(txout['script_pubkey'])
+    return b''.join(parts)
+
+# Function to precompute the input-independent BIP143 digests
+def build_sighash_ctx(tx_inputs, tx_outputs):
+    """Precompute the BIP143 prevouts/sequences/outputs digests.
+
+    These three double-SHA256 digests depend only on the transaction's inputs
+    and outputs as a whole, not on which input is being signed, so they are
+    computed once and shared across every per-input sighash.
+    """
     prevouts = hashlib.sha256(hashlib.sha256(b''.join(
-        [txin['prev_txid'] + struct.pack('<I', txin['prev_index']) for txin in tx_inputs]
+        txin['prev_txid'] + _PACK_U32(txin['prev_index']) for txin in tx_inputs
     )).digest()).digest()
 
     sequences = hashlib.sha256(hashlib.sha256(b''.join(
-        struct.pack('<I', txin['sequence']) for txin in tx_inputs
+        _PACK_U32(txin['sequence']) for txin in tx_inputs
     )).digest()).digest()
 
-    scriptCode = serialize_varint(len(redeem_script)) + redeem_script
-
     outputs = hashlib.sha256(hashlib.sha256(b''.join(
-        [struct.pack('<Q', txout['value']) + serialize_varint(len(txout['script_pubkey'])) + txout['script_pubkey']
-        for txout in tx_outputs]
+        _PACK_U64(txout['value']) + serialize_varint(len(txout['script_pubkey'])) + txout['script_pubkey']
+        for txout in tx_outputs
     )).digest()).digest()
 
-    preimage = (
-        struct.pack('<I', tx_version) +
-        prevouts +
-        sequences +
-        tx_inputs[0]['prev_txid'] +
-        struct.pack('<I', tx_inputs[0]['prev_index']) +
-        scriptCode +
-        struct.pack('<Q', 100000) +  # UTXO value
-        struct.pack('<I', tx_inputs[0]['sequence']) +
-        outputs +
-        struct.pack('<I', 0) +  # locktime
-        struct.pack('<I', 0x01)  # SIGHASH_ALL
-    )
+    return prevouts, sequences, outputs
+
+# Function to create sighash for one input using the precomputed context
+def calculate_sighash(ctx, tx_version, txin, redeem_script, utxo_value, locktime):
+    """Calculate the BIP143 sighash for a single input."""
+    prevouts, sequences, outputs = ctx
+
+    scriptCode = serialize_varint(len(redeem_script)) + redeem_script
+
+    preimage = b''.join((
+        _PACK_U32(tx_version),
+        prevouts,
+        sequences,
+        txin['prev_txid'],
+        _PACK_U32(txin['prev_index']),
+        scriptCode,
+        _PACK_U64(utxo_value),
+        _PACK_U32(txin['sequence']),
+        outputs,
+        _PACK_U32(locktime),
+        _PACK_U32(0x01),  # SIGHASH_ALL
+    ))
 
     return hashlib.sha256(hashlib.sha256(preimage).digest()).digest()
 
 # Function to generate signatures for a multisig transaction
 def generate_signatures(sighash, priv_key_1, priv_key_2):
-    """Generate signatures for the multisig transaction."""
-    priv1 = SigningKey.from_string(bytes.fromhex(priv_key_1), curve=SECP256k1)
-    sig1 = priv1.sign_digest(sighash, sigencode=sigencode_der) + bytes([0x01])
+    """Generate signatures for the multisig transaction.
 
-    priv2 = SigningKey.from_string(bytes.fromhex(priv_key_2), curve=SECP256k1)
-    sig2 = priv2.sign_digest(sighash, sigencode=sigencode_der) + bytes([0x01])
+    Uses coincurve (libsecp256k1 bindings, the same library Bitcoin Core
+    signs with) rather than the pure-Python ecdsa package; hasher=None signs
+    the already-computed sighash digest directly and returns DER.
+    """
+    sig1 = PrivateKey(bytes.fromhex(priv_key_1)).sign(sighash, hasher=None) + bytes([0x01])
+    sig2 = PrivateKey(bytes.fromhex(priv_key_2)).sign(sighash, hasher=None) + bytes([0x01])
 
     return sig1, sig2
 
@@ -165,8 +205,9 @@ if __name__ == "__main__":
         'script_pubkey': script_pubkey
     }]
     
-    # Sighash calculation
-    sighash = calculate_sighash(tx_version, tx_inputs, tx_outputs, redeem_script, 0)
+    # Sighash calculation: build the shared digests once, then hash per input
+    sighash_ctx = build_sighash_ctx(tx_inputs, tx_outputs)
+    sighash = calculate_sighash(sighash_ctx, tx_version, tx_inputs[0], redeem_script, 100000, 0)
     print(f"Sighash: {sighash.hex()}")
 
     # Generate signatures
@@ -1,4 +1,5 @@
-pip install ecdsa
+pip install coincurve
 pip install base58
+pip install pycryptodome
 pip install python-bitcoinlib
 python ./python/main.py
\ No newline at end of file
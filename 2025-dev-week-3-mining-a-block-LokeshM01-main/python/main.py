@@ -1,9 +1,12 @@
 import os
-import json
 import hashlib
 import time
-from struct import pack
-from io import BytesIO
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from struct import pack, Struct
+
+import orjson
 
 mempool_folder = "mempool"
 output_file = "out.txt"
@@ -14,110 +17,145 @@ max_block_size = 4000000
 def hash_twice(data):
     return hashlib.sha256(hashlib.sha256(data).digest()).digest()
 
-# Load transaction files from the mempool folder
+def merkle_root(leaves):
+    """Reduce a list of 32-byte digests to the merkle root in one buffer.
+
+    All levels of the tree are folded inside a single preallocated bytearray:
+    sibling pairs sit in contiguous 64-byte runs, each pair is hashed straight
+    out of the buffer through a memoryview slice, and the parent digest is
+    written back over the front half. No per-level lists of fresh bytes
+    objects are built; the odd-width duplicate is a 32-byte copy at the tail.
+    hashlib's sha256 is OpenSSL-backed (SHA-NI on x86, crypto extensions on
+    ARMv8), so each pair costs a single batched call.
+    """
+    if not leaves:
+        return bytes(32)
+    count = len(leaves)
+    # Resolve every level's width and padding up front so the reduction loop
+    # carries no conditional bookkeeping. Padding the leaves to the next power
+    # of two instead would drop the duplication entirely, but it changes the
+    # root whenever an intermediate level is odd (6 leaves is the smallest
+    # case), so Bitcoin's per-level duplicate-last rule has to be kept.
+    level_widths = []
+    width = count
+    while width > 1:
+        padded = width + (width & 1)
+        level_widths.append((width, padded))
+        width = padded // 2
+    buf = bytearray((count + 1) * 32)  # one spare slot covers any odd level
+    view = memoryview(buf)
+    pos = 0
+    for leaf in leaves:
+        view[pos:pos + 32] = leaf
+        pos += 32
+    sha256 = hashlib.sha256
+    for width, padded in level_widths:
+        if padded != width:
+            view[width * 32:padded * 32] = view[(width - 1) * 32:width * 32]
+        for i in range(padded // 2):
+            view[i * 32:(i + 1) * 32] = sha256(
+                sha256(view[i * 64:(i + 1) * 64]).digest()).digest()
+    return bytes(view[:32])
+
+def double_sha256_many(items):
+    """Double-SHA256 an iterable of byte strings in one batched sweep."""
+    sha256 = hashlib.sha256
+    return [sha256(sha256(item).digest()).digest() for item in items]
+
+# Load transaction files from the mempool folder. Thousands of small JSON
+# files are parsed, so fan the reads out over a thread pool and decode with
+# orjson; scandir entries already carry the full path, avoiding the extra
+# join/stat per file that listdir would cost.
+def load_tx_file(entry):
+    try:
+        with open(entry.path, 'rb') as f:
+            return orjson.loads(f.read())
+    except Exception as e:
+        print(f"Skipping {entry.name}: {str(e)}")
+        return None
+
 tx_list = []
-for filename in os.listdir(mempool_folder):
-    if filename.endswith('.json'):
-        file_path = os.path.join(mempool_folder, filename)
-        try:
-            with open(file_path) as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    tx_list.extend(data)
-                else:
-                    tx_list.append(data)
-        except Exception as e:
-            print(f"Skipping {filename}: {str(e)}")
-
-# Select transactions to fit within block weight limits
+with os.scandir(mempool_folder) as entries:
+    json_entries = [entry for entry in entries if entry.name.endswith('.json')]
+with ThreadPoolExecutor(max_workers=32) as executor:
+    for data in executor.map(load_tx_file, json_entries):
+        if data is None:
+            continue
+        if isinstance(data, list):
+            tx_list.extend(data)
+        else:
+            tx_list.append(data)
+
+# Select transactions to fit within block weight limits. Fee rates are
+# computed once up front and the sort works on indices; a running-sum +
+# bisect finds the longest prefix of the ranked list that fits in one shot,
+# and only the tail past that point needs the per-tx greedy scan (the
+# original loop keeps trying lighter transactions after one overflows).
 valid_txs = [tx for tx in tx_list if all(field in tx for field in ('fee', 'weight'))]
-valid_txs.sort(key=lambda tx: tx['fee'] / tx['weight'], reverse=True)
-selected_txs = []
-total_weight = 0
-for tx in valid_txs:
-    if (total_weight + tx['weight']) <= (max_block_size - 4000):
-        selected_txs.append(tx)
-        total_weight += tx['weight']
+weight_budget = max_block_size - 4000
+feerates = [tx['fee'] / tx['weight'] for tx in valid_txs]
+order = sorted(range(len(valid_txs)), key=feerates.__getitem__, reverse=True)
+ranked_weights = [valid_txs[i]['weight'] for i in order]
+cumulative_weights = list(accumulate(ranked_weights))
+cutoff = bisect_right(cumulative_weights, weight_budget)
+selected_txs = [valid_txs[i] for i in order[:cutoff]]
+total_weight = cumulative_weights[cutoff - 1] if cutoff else 0
+for pos in range(cutoff, len(order)):
+    if (total_weight + ranked_weights[pos]) <= weight_budget:
+        selected_txs.append(valid_txs[order[pos]])
+        total_weight += ranked_weights[pos]
 
 total_fees = sum(tx['fee'] for tx in selected_txs)
 
-# Compute wtxid list
-tx_wtxid_list = []
-coinbase_stream = BytesIO()
-tx_version = pack('<I', 1)
-segwit_marker = b'\x00'
-segwit_flag = b'\x01'
+# Coinbase transaction. Every field has a fixed width, so the whole thing is
+# assembled by a single C-level Struct.pack call; the 32-byte witness
+# commitment is packed as zeros and patched in place once the witness merkle
+# root is known (the witness merkle always uses bytes(32) for the coinbase
+# leaf, so a pre-commitment serialization pass is never needed). The slot
+# offset falls out of the size of the format prefix up to the commitment.
 script_sig = pack('<B', 4) + b'\x00'*4
-coinbase_stream.write(tx_version)
-coinbase_stream.write(segwit_marker)
-coinbase_stream.write(segwit_flag)
-coinbase_stream.write(b'\x01')
-coinbase_stream.write(bytes(32))
-coinbase_stream.write(pack('<I', 0xFFFFFFFF))
-coinbase_stream.write(bytes([len(script_sig)]))
-coinbase_stream.write(script_sig)
-coinbase_stream.write(b'\xFF'*4)
-coinbase_stream.write(b'\x02')
-coinbase_stream.write(pack('<Q', 5000000000 + total_fees))
-coinbase_stream.write(b'\x19')
-coinbase_stream.write(bytes.fromhex('76a914000000000000000000000000000000000000000088ac'))
-commitment_script = bytes.fromhex('6a24aa21a9ed') + bytes(32)
-coinbase_stream.write(b'\x00'*8)
-coinbase_stream.write(bytes([len(commitment_script)]))
-coinbase_stream.write(commitment_script)
-coinbase_stream.write(b'\x01')
-coinbase_stream.write(b'\x20')
-coinbase_stream.write(witness_reserved_value)
-coinbase_stream.write(pack('<I', 0))
-coinbase_tx = coinbase_stream.getvalue()
-tx_wtxid_list.append(hash_twice(coinbase_tx)[::-1].hex())
+reward_script = bytes.fromhex('76a914000000000000000000000000000000000000000088ac')
+commitment_header = bytes.fromhex('6a24aa21a9ed')
 
-for tx in selected_txs:
-    tx_wtxid_list.append(hash_twice(bytes.fromhex(tx['hex']))[::-1].hex())
+_COINBASE_STRUCT = Struct('<I2sB32sIB5s4sBQB25sQB38sBB32sI')
+commitment_offset = Struct('<I2sB32sIB5s4sBQB25sQB').size + len(commitment_header)
+
+coinbase_ba = bytearray(_COINBASE_STRUCT.pack(
+    1,                                          # version
+    b'\x00\x01',                                # segwit marker + flag
+    1,                                          # input count
+    bytes(32),                                  # coinbase prevout txid
+    0xFFFFFFFF,                                 # prevout index
+    len(script_sig), script_sig,
+    b'\xFF'*4,                                  # sequence
+    2,                                          # output count
+    5000000000 + total_fees,                    # block reward
+    len(reward_script), reward_script,
+    0,                                          # commitment output value
+    len(commitment_header) + 32,
+    commitment_header + bytes(32),              # commitment placeholder
+    1,                                          # witness stack items
+    32, witness_reserved_value,
+    0,                                          # locktime
+))
+
+# Compute wtxid list, kept as raw double-SHA256 digests in internal byte
+# order; hex encoding and byte reversal only happen at the final output write.
+tx_wtxid_list = double_sha256_many(bytes.fromhex(tx['hex']) for tx in selected_txs)
 
 # Compute witness commitment
-hash_list = [bytes(32)] + [bytes.fromhex(txid)[::-1] for txid in tx_wtxid_list[1:]] if tx_wtxid_list else []
-while len(hash_list) > 1:
-    if len(hash_list) % 2:
-        hash_list.append(hash_list[-1])
-    hash_list = [hash_twice(hash_list[i] + hash_list[i+1]) for i in range(0, len(hash_list), 2)]
-witness_root_hash = hash_list[0] if hash_list else bytes(32)
+witness_root_hash = merkle_root([bytes(32)] + tx_wtxid_list)
 witness_commitment_value = hash_twice(witness_root_hash + witness_reserved_value)
 
-# Recreate coinbase transaction with correct witness commitment
-coinbase_stream = BytesIO()
-coinbase_stream.write(tx_version)
-coinbase_stream.write(segwit_marker)
-coinbase_stream.write(segwit_flag)
-coinbase_stream.write(b'\x01')
-coinbase_stream.write(bytes(32))
-coinbase_stream.write(pack('<I', 0xFFFFFFFF))
-coinbase_stream.write(bytes([len(script_sig)]))
-coinbase_stream.write(script_sig)
-coinbase_stream.write(b'\xFF'*4)
-coinbase_stream.write(b'\x02')
-coinbase_stream.write(pack('<Q', 5000000000 + total_fees))
-coinbase_stream.write(b'\x19')
-coinbase_stream.write(bytes.fromhex('76a914000000000000000000000000000000000000000088ac'))
-commitment_script = bytes.fromhex('6a24aa21a9ed') + witness_commitment_value
-coinbase_stream.write(b'\x00'*8)
-coinbase_stream.write(bytes([len(commitment_script)]))
-coinbase_stream.write(commitment_script)
-coinbase_stream.write(b'\x01')
-coinbase_stream.write(b'\x20')
-coinbase_stream.write(witness_reserved_value)
-coinbase_stream.write(pack('<I', 0))
-coinbase_tx_final = coinbase_stream.getvalue()
-coinbase_wtxid = hash_twice(coinbase_tx_final)[::-1].hex()
-
-# Build merkle root
-tx_id_list = [coinbase_wtxid] + [tx['txid'] for tx in selected_txs]
-hash_items = [bytes.fromhex(txid)[::-1] for txid in tx_id_list] if tx_id_list else []
-while len(hash_items) > 1:
-    if len(hash_items) % 2:
-        hash_items.append(hash_items[-1])
-    hash_items = [hash_twice(hash_items[i] + hash_items[i+1]) for i in range(0, len(hash_items), 2)]
-merkle_root_hash = hash_items[0] if hash_items else bytes(32)
+# Patch the witness commitment into the already-built coinbase
+coinbase_ba[commitment_offset:commitment_offset + 32] = witness_commitment_value
+coinbase_tx_final = bytes(coinbase_ba)
+coinbase_wtxid = hash_twice(coinbase_tx_final)
+
+# Build merkle root; the coinbase digest is already in internal byte order,
+# only the JSON txids need a one-time decode and reverse.
+hash_items = [coinbase_wtxid] + [bytes.fromhex(tx['txid'])[::-1] for tx in selected_txs]
+merkle_root_hash = merkle_root(hash_items)
 
 # Block mining setup
 block_version = pack('<I', 0x20000000)
@@ -127,19 +165,36 @@ block_bits = pack('<I', 0x1f00ffff)
 block_header = block_version + prev_block_hash + merkle_root_hash + timestamp_now + block_bits
 target_value = target_threshold
 
-# Finding a valid nonce
+# Finding a valid nonce. The 76-byte header prefix never changes, so hash it
+# once and snapshot the midstate with .copy(); each attempt then only feeds the
+# 4-byte nonce tail instead of re-hashing the whole header. The reversed
+# comparison is gated on the two bytes that must be zero for this target so the
+# slice-reverse only runs on near-misses.
+sha256 = hashlib.sha256
+pack_nonce = Struct('<I').pack
+header_midstate = sha256(block_header)
 for nonce in range(0, 0xFFFFFFFF):
-    full_block_header = block_header + pack('<I', nonce)
-    block_hash_attempt = hash_twice(full_block_header)[::-1]
-    if block_hash_attempt < target_value:
-        mined_block_header = full_block_header
+    attempt = header_midstate.copy()
+    attempt.update(pack_nonce(nonce))
+    digest = sha256(attempt.digest()).digest()
+    if digest[30:] == b'\x00\x00' and digest[::-1] < target_value:
+        mined_block_header = block_header + pack_nonce(nonce)
         mined_nonce = nonce
         break
 else:
     raise ValueError("Valid nonce not found")
 
-# Save mined block data
-with open(output_file, 'w') as f:
-    f.write(mined_block_header.hex() + '\n')
-    f.write(coinbase_tx_final.hex() + '\n')
-    f.write('\n'.join([coinbase_wtxid] + [tx['txid'] for tx in selected_txs]))
\ No newline at end of file
+# Save mined block data with one binary write; everything here is ASCII hex,
+# so assembling a single bytes buffer skips the text encoder and the large
+# intermediate string a '\n'.join of thousands of txids would build.
+out_buf = bytearray()
+out_buf += mined_block_header.hex().encode()
+out_buf += b'\n'
+out_buf += coinbase_tx_final.hex().encode()
+out_buf += b'\n'
+out_buf += coinbase_wtxid[::-1].hex().encode()
+for tx in selected_txs:
+    out_buf += b'\n'
+    out_buf += tx['txid'].encode()
+with open(output_file, 'wb') as f:
+    f.write(out_buf)
\ No newline at end of file
@@ -1 +1,2 @@
+pip install orjson
 python ./python/main.py
\ No newline at end of file